@@ -1,12 +1,24 @@
+import bisect
+import collections
+import functools
+import logging
 import os
+import re
 import sys
 
 import scheduler
 
 READ_CHUNK_SIZE = 1024
 
+# Consumed bytes are discarded from the front of the input buffer once the read position has
+# advanced past this many bytes (or when all bytes have been consumed)
+INPUT_BUFFER_COMPACT_THRESHOLD = 4096
+
 MAX_HISTORY = 100
 
+# Maximum number of token matching results that are cached (shared by all CLI sessions)
+MATCH_TOKEN_CACHE_SIZE = 128
+
 CONTROL_A = 1
 CONTROL_E = 5
 CONTROL_N = 14
@@ -35,6 +47,123 @@ VT100_CURSOR_RIGHT = 67
 VT100_CURSOR_LEFT = 68
 VT100_ERASE_TO_END_OF_LINE = 75
 
+# A run of two or more printable ASCII characters (space up to and including tilde), except the
+# question mark which triggers context-sensitive help. Such runs (typically pasted text) are
+# inserted into the command buffer in one go instead of byte by byte.
+PRINTABLE_RUN_REGEX = re.compile(b'[\x20-\x3e\x40-\x7e]{2,}')
+
+# Pre-built single-byte bytes objects, indexed by byte value, to avoid building one for every
+# echoed or sent byte
+SINGLE_BYTES = tuple(bytes([value]) for value in range(256))
+
+CARRIAGE_RETURN_LINE_FEED = bytes([CARRIAGE_RETURN, LINE_FEED])
+
+# Pre-encoded VT100 escape sequences for the output sent on (almost) every keystroke
+VT100_CONTROL_SEQUENCE_INTRODUCER = bytes([ESCAPE, VT100_LEFT_SQUARE_BRACKET])
+VT100_CURSOR_LEFT_ONE_SEQUENCE = (VT100_CONTROL_SEQUENCE_INTRODUCER + b'1' +
+                                  bytes([VT100_CURSOR_LEFT]))
+VT100_CURSOR_RIGHT_ONE_SEQUENCE = (VT100_CONTROL_SEQUENCE_INTRODUCER + b'1' +
+                                   bytes([VT100_CURSOR_RIGHT]))
+VT100_ERASE_TO_END_OF_LINE_SEQUENCE = (VT100_CONTROL_SEQUENCE_INTRODUCER +
+                                       bytes([VT100_ERASE_TO_END_OF_LINE]))
+
+@functools.lru_cache(maxsize=64)
+def vt100_cursor_move_sequence(positions, direction):
+    return VT100_CONTROL_SEQUENCE_INTRODUCER + b'%d' % positions + SINGLE_BYTES[direction]
+
+def vt100_cursor_left_sequence(positions):
+    if positions == 0:
+        return b''
+    if positions == 1:
+        return VT100_CURSOR_LEFT_ONE_SEQUENCE
+    return vt100_cursor_move_sequence(positions, VT100_CURSOR_LEFT)
+
+def vt100_cursor_right_sequence(positions):
+    if positions == 0:
+        return b''
+    if positions == 1:
+        return VT100_CURSOR_RIGHT_ONE_SEQUENCE
+    return vt100_cursor_move_sequence(positions, VT100_CURSOR_RIGHT)
+
+def help_sort_key(token):
+    # In help output, parameters are sorted by their name (without the $ prefix)
+    if (len(token) > 1) and (token[0] == "$"):
+        return token[1:]
+    else:
+        return token
+
+class ParseSubtreeIndex:
+
+    # Information about a parse subtree that is derived once from the (immutable) parse tree:
+    # - The sorted list of keywords, and the sorted list of parameter names (without the $ prefix)
+    #   which allow tokens to be looked up by prefix using a binary search.
+    # - For each parameter name (without the $ prefix), the parameter name with the $ prefix and the
+    #   parse sub-subtree, so that matching a parameter does not have to add the $ prefix.
+    # - The items of the subtree in the order in which they are listed in help output.
+
+    def __init__(self, parse_subtree):
+        self.parse_subtree = parse_subtree
+        self.keywords = sorted(parse_subtree.keys())
+        self.parameter_items = {keyword[1:]: (keyword, parse_subtree[keyword])
+                                for keyword in self.keywords if keyword.startswith('$')}
+        self.parameters = sorted(self.parameter_items.keys())
+        # The sort key is computed once per item (not once per comparison)
+        help_tokens = sorted(parse_subtree.keys(), key=help_sort_key)
+        self.help_items = [(token, parse_subtree[token]) for token in help_tokens]
+
+def index_parse_tree(parse_tree, index):
+    # Store a ParseSubtreeIndex for every parse subtree in the index, keyed by the id of the subtree
+    if callable(parse_tree) or id(parse_tree) in index:
+        return
+    index[id(parse_tree)] = ParseSubtreeIndex(parse_tree)
+    for parse_subtree in parse_tree.values():
+        index_parse_tree(parse_subtree, index)
+
+# The index of a parse tree only depends on the (immutable) parse tree itself, so it is built once
+# and shared by all CLI sessions that use that parse tree. Keyed by the id of the parse tree; the
+# index refers to the parse tree, so the id cannot be reused while the index exists.
+PARSE_TREE_INDEXES = {}
+
+def get_parse_tree_index(parse_tree):
+    index = PARSE_TREE_INDEXES.get(id(parse_tree))
+    if index is None:
+        index = {}
+        index_parse_tree(parse_tree, index)
+        PARSE_TREE_INDEXES[id(parse_tree)] = index
+    return index
+
+def tokens_with_prefix(sorted_tokens, prefix):
+    start = bisect.bisect_left(sorted_tokens, prefix)
+    end = start
+    while end < len(sorted_tokens) and sorted_tokens[end].startswith(prefix):
+        end += 1
+    return sorted_tokens[start:end]
+
+# The parse tree never changes, so the tokens that match at a given point in the parse tree are
+# always the same. Cache them, so that re-parsing a command (e.g. for context-sensitive help or a
+# command recalled from the history) does not have to look up every token again.
+@functools.lru_cache(maxsize=MATCH_TOKEN_CACHE_SIZE)
+def match_token_in_parse_subtree(token, parse_tree_id, parse_subtree_id):
+    # Return a tuple of two (possibly empty) tuples: the parse sub-sub-trees whose keyword matches
+    # the token, and the parse sub-sub-trees whose parameter matches the token. The parse tree must
+    # have been indexed by get_parse_tree_index.
+    subtree_index = PARSE_TREE_INDEXES[parse_tree_id][parse_subtree_id]
+    parse_subtree = subtree_index.parse_subtree
+    if token in parse_subtree:
+        # Exact match on keyword, don't consider anything else
+        return (((token, parse_subtree[token]),), ())
+    parameter_items = subtree_index.parameter_items
+    parameter_item = parameter_items.get(token)
+    if parameter_item is not None:
+        # Exact match on parameter, don't consider anything else
+        return ((), ((token, parameter_item[1]),))
+    # No exact match. Look for partial matches.
+    keywords = tokens_with_prefix(subtree_index.keywords, token)
+    parameters = tokens_with_prefix(subtree_index.parameters, token)
+    keyword_subsubtrees = tuple((keyword, parse_subtree[keyword]) for keyword in keywords)
+    param_subsubtrees = tuple(parameter_items[parameter] for parameter in parameters)
+    return (keyword_subsubtrees, param_subsubtrees)
+
 class CliSessionHandler:
 
     def __init__(self, sock, rx_fd, tx_fd, parse_tree, command_handler, log, node):
@@ -42,48 +171,61 @@ class CliSessionHandler:
         # it is something else than None; we never use the socket, but we need to store it anyway
         # to prevent the socket from being garbage collected causing the connection to be closed.
         self._sock = sock
+        self._peername = None
         self._rx_fd = rx_fd
         self._tx_fd = tx_fd
+        self._tx_pending = bytearray()
         self._parse_tree = parse_tree
+        self._parse_tree_index = get_parse_tree_index(parse_tree)
         self._command_handler = command_handler
         self._log = log
         self._current_node = node
-        self._input_bytes_buffer = bytes()
-        self._command_buffer = bytes()
+        self._input_bytes_buffer = bytearray()
+        self._input_bytes_pos = 0
+        self._command_buffer = bytearray()
         self._command_buffer_pos = 0
-        self._command_history = []
+        # The oldest command is automatically discarded when the history is full
+        self._command_history = collections.deque(maxlen=MAX_HISTORY)
         self._command_history_pos = None
         self._next_commands = []
         self.info("Open CLI session")
         self._telnet = (sock is not None)
         self._telnet_suppress_go_ahead = False
         self._telnet_echo = False
+        self._must_echo = not self._telnet
         if self._telnet:
             self.send_will_suppress_go_ahead()
             self.send_will_echo()
         scheduler.SCHEDULER.register_handler(self)
         self.print_prompt()
+        self.flush_output()
 
     def peername(self):
+        # The peer of a session never changes, so only ask the socket once
+        if self._peername is not None:
+            return self._peername
         if self._sock:
             try:
-                return self._sock.getpeername()[0] + ":" + str(self._sock.getpeername()[1])
+                (address, port) = self._sock.getpeername()[0:2]
             except OSError:
                 return "?:?"
+            self._peername = address + ":" + str(port)
         else:
-            return "local"
+            self._peername = "local"
+        return self._peername
 
     def info(self, msg, *args):
-        self._log.info("[%s] %s: %s" % (self.current_node_name(), self.peername(), msg), *args)
+        if not self._log.isEnabledFor(logging.INFO):
+            return
+        self._log.info("[%s] %s: " + msg, self.current_node_name(), self.peername(), *args)
 
     def close(self):
         self.info("Close CLI session")
         scheduler.SCHEDULER.unregister_handler(self)
+        self.flush_output()
         if self._telnet:
-            # Telnet session, close the file descriptors and keep running
-            os.close(self._rx_fd)
-            if self._tx_fd != self._rx_fd:
-                os.close(self._tx_fd)
+            # Telnet session, close the socket (which owns the file descriptors) and keep running
+            self._sock.close()
             self._rx_fd = None
             self._tx_fd = None
         else:
@@ -101,17 +243,20 @@ class CliSessionHandler:
             return
         if add_newline:
             message += '\n'
-        if self.must_echo():
+        if self._must_echo:
             fixed_message = message.replace('\n', '\r\n')
         else:
             fixed_message = message
-        os.write(self._tx_fd, fixed_message.encode('utf-8'))
+        # Command output can be large and slow to produce; stream it out as it is produced instead
+        # of holding it back until the whole command has been processed.
+        self.send_bytes(fixed_message.encode('utf-8'))
+        self.flush_output()
 
     def help(self):
         self.print_help("", self._parse_tree)
 
     def print_help(self, normalized_parsed, parse_subtree):
-        self.print_help_recursion("", parse_subtree, normalized_parsed)
+        self.print_help_subtree("", parse_subtree, normalized_parsed)
 
     def print_ambiguous_help(self, normalized_parsed, parse_subsubtrees):
         prefix = normalized_parsed
@@ -120,28 +265,27 @@ class CliSessionHandler:
                 prefix += match_token[1:] + ' <' + match_token[1:] + '> '
             else:
                 prefix += match_token + ' '
-            self.print_help_recursion("", match_parse_subtree, prefix)
-
-    @staticmethod
-    def token_key(item):
-        token = item[0]
-        if (len(token) > 1) and (token[0] == "$"):
-            return token[1:]
-        else:
-            return token
-
-    def print_help_recursion(self, command_str, parse_subtree, prefix):
-        if callable(parse_subtree):
-            self.print(prefix + command_str)
-        else:
-            for match_str, new_parse_subtree in sorted(parse_subtree.items(), key=self.token_key):
+            self.print_help_subtree("", match_parse_subtree, prefix)
+
+    def print_help_subtree(self, command_str, parse_subtree, prefix):
+        # Depth-first walk of the parse subtree, using an explicit stack instead of recursion. The
+        # items of each subtree are pushed in reverse order, so that they are printed in sorted
+        # order.
+        stack = [(command_str, parse_subtree)]
+        while stack:
+            (command_str, parse_subtree) = stack.pop()
+            if callable(parse_subtree):
+                self.print(prefix + command_str)
+                continue
+            help_items = self._parse_tree_index[id(parse_subtree)].help_items
+            for match_str, new_parse_subtree in reversed(help_items):
                 if match_str == '':
                     new_command_str = command_str
                 elif match_str[0] == '$':
                     new_command_str = command_str + "{0} <{0}> ".format(match_str[1:])
                 else:
                     new_command_str = command_str + match_str + " "
-                self.print_help_recursion(new_command_str, new_parse_subtree, prefix)
+                stack.append((new_command_str, new_parse_subtree))
 
     def parse_command(self, command, context_help=False):
         tokens = command.split()
@@ -150,59 +294,50 @@ class CliSessionHandler:
 
     def consume_token(self, tokens):
         if tokens:
-            token = tokens[0]
-            tokens = tokens[1:]
+            return tokens.popleft()
         else:
-            token = None
-        return (token, tokens)
+            return None
 
     def parse_tokens(self, tokens, parse_subtree, normalized_parsed, parameters, context_help):
         # pylint:disable=too-many-statements
-        if tokens == []:
-            # We have consumed all tokens in the command.
-            if callable(parse_subtree):
-                # We have also reached a leaf in the parse tree.
-                if not context_help:
-                    # Call the command handler function (but not when giving context-sensitive help)
-                    command_function = parse_subtree
-                    if parameters:
-                        command_function(self._command_handler, self, parameters)
-                    else:
-                        command_function(self._command_handler, self)
-            elif '' in parse_subtree:
-                # There is a branch in parse tree for "no more input".
-                if context_help:
-                    self.print("Possible completions:")
-                    self.print_help(normalized_parsed, parse_subtree)
-                else:
+        # Walk down the parse tree, consuming a keyword, or a parameter name and its value, in each
+        # iteration of the loop (instead of recursing for each token).
+        tokens = collections.deque(tokens)
+        while True:
+            if not tokens:
+                # We have consumed all tokens in the command.
+                if callable(parse_subtree):
+                    # We have also reached a leaf in the parse tree.
+                    if not context_help:
+                        # Call the command handler function (but not when giving context-sensitive
+                        # help)
+                        command_function = parse_subtree
+                        if parameters:
+                            command_function(self._command_handler, self, parameters)
+                        else:
+                            command_function(self._command_handler, self)
+                    return
+                if '' in parse_subtree:
+                    # There is a branch in parse tree for "no more input".
+                    if context_help:
+                        self.print("Possible completions:")
+                        self.print_help(normalized_parsed, parse_subtree)
+                        return
                     # Follow that branch.
-                    new_parse_subtree = parse_subtree['']
-                    self.parse_tokens(tokens, new_parse_subtree, normalized_parsed, parameters,
-                                      context_help)
-            else:
+                    parse_subtree = parse_subtree['']
+                    continue
                 # There should have been more to parse. Generate an error
                 self.print("Missing input, possible completions:")
                 self.print_help(normalized_parsed, parse_subtree)
                 return
-        else:
             # Parse the next token
-            (token, tokens) = self.consume_token(tokens)
-            if (token is not None) and callable(parse_subtree):
+            token = self.consume_token(tokens)
+            if callable(parse_subtree):
                 # We have more tokens, but we have reached a leaf of the parse tree. Report error.
                 self.print("Unexpected extra input: {}".format(token))
                 return
-            if token in parse_subtree:
-                # Exact match on keyword, don't consider anything else
-                keyword_subsubtrees = [(token, parse_subtree[token])]
-                param_subsubtrees = []
-            elif '$' + token in parse_subtree:
-                # Exact match on parameter, don't consider anything else
-                keyword_subsubtrees = []
-                param_subsubtrees = [(token, parse_subtree['$' + token])]
-            else:
-                # No exact match. Look for partial matches.
-                keyword_subsubtrees = self.lookup_token_in_parse_subtree(token, parse_subtree)
-                param_subsubtrees = self.lookup_token_in_parse_subtree('$' + token, parse_subtree)
+            matches = match_token_in_parse_subtree(token, id(self._parse_tree), id(parse_subtree))
+            (keyword_subsubtrees, param_subsubtrees) = matches
             all_subsubtrees = keyword_subsubtrees + param_subsubtrees
             if len(all_subsubtrees) > 1:
                 # Token matches more than one keyword and/or parameter. Ambiguous token error.
@@ -210,18 +345,14 @@ class CliSessionHandler:
                 self.print_ambiguous_help(normalized_parsed, all_subsubtrees)
                 return
             if len(keyword_subsubtrees) == 1:
-                # Token matches exactly one keyword. Recursively continue parsing.
-                keyword = keyword_subsubtrees[0][0]
+                # Token matches exactly one keyword. Continue parsing.
+                (keyword, parse_subtree) = keyword_subsubtrees[0]
                 normalized_parsed += keyword + " "
-                parse_subtree = keyword_subsubtrees[0][1]
-                self.parse_tokens(tokens, parse_subtree, normalized_parsed, parameters,
-                                  context_help)
-                return
+                continue
             if len(param_subsubtrees) == 1:
                 # Token matches exactly one parameter. Store parameter and continue parsing.
-                parameter_name = param_subsubtrees[0][0]
-                parse_subtree = param_subsubtrees[0][1]
-                (token, tokens) = self.consume_token(tokens)
+                (parameter_name, parse_subtree) = param_subsubtrees[0]
+                token = self.consume_token(tokens)
                 if token is None:
                     if context_help:
                         self.print(normalized_parsed + parameter_name + " <" + parameter_name + ">")
@@ -231,20 +362,11 @@ class CliSessionHandler:
                     parameter_name = parameter_name[1:]
                 normalized_parsed += token + " "
                 parameters[parameter_name] = token
-                self.parse_tokens(tokens, parse_subtree, normalized_parsed, parameters,
-                                  context_help)
-                return
+                continue
             # Token is neither a keyword nor a parameter. Generate an error.
             self.print('Unrecognized input "{}", expected:'.format(token))
             self.print_help(normalized_parsed, parse_subtree)
-
-    def lookup_token_in_parse_subtree(self, token, parse_subtree):
-        # Return the (possibly empty) list of parse sub-sub-trees that match the token
-        parse_subsubtrees = []
-        for match_token, match_parse_subtree in parse_subtree.items():
-            if match_token.startswith(token):
-                parse_subsubtrees.append((match_token, match_parse_subtree))
-        return parse_subsubtrees
+            return
 
     def current_node_name(self):
         if self._current_node:
@@ -256,16 +378,19 @@ class CliSessionHandler:
         self.print(self.current_node_name() + "> ", False)
 
     def refresh_command_from_pos(self):
-        self.send_erase_to_end_of_line()
-        positions = len(self._command_buffer[self._command_buffer_pos:])
-        self.send_bytes(self._command_buffer[self._command_buffer_pos:])
-        self.send_cursor_left(positions)
+        # Erase the rest of the line, redraw it, and move the cursor back, all in one message
+        positions = len(self._command_buffer) - self._command_buffer_pos
+        self.send_bytes_parts([VT100_ERASE_TO_END_OF_LINE_SEQUENCE,
+                               memoryview(self._command_buffer)[self._command_buffer_pos:],
+                               vt100_cursor_left_sequence(positions)])
 
     def replace_command(self, new_command):
-        self.process_cursor_to_start_of_line()
-        self.send_erase_to_end_of_line()
-        self._command_buffer = new_command
-        self.send_bytes(self._command_buffer)
+        # Move the cursor to the start of the line, erase the line, and draw the new command, all
+        # in one message
+        self.send_bytes_parts([vt100_cursor_left_sequence(self._command_buffer_pos),
+                               VT100_ERASE_TO_END_OF_LINE_SEQUENCE,
+                               new_command])
+        self._command_buffer = bytearray(new_command)
         self._command_buffer_pos = len(self._command_buffer)
 
     def send_will_suppress_go_ahead(self):
@@ -277,53 +402,53 @@ class CliSessionHandler:
         self.send_bytes(msg)
 
     def send_cursor_left(self, positions=1):
-        if positions == 0:
-            return
-        msg = (bytes([ESCAPE, VT100_LEFT_SQUARE_BRACKET]) +
-               str(positions).encode() +
-               bytes([VT100_CURSOR_LEFT]))
-        self.send_bytes(msg)
+        if positions > 0:
+            self.send_bytes(vt100_cursor_left_sequence(positions))
 
     def send_cursor_right(self, positions=1):
-        if positions == 0:
-            return
-        msg = (bytes([ESCAPE, VT100_LEFT_SQUARE_BRACKET]) +
-               str(positions).encode() +
-               bytes([VT100_CURSOR_RIGHT]))
-        self.send_bytes(msg)
+        if positions > 0:
+            self.send_bytes(vt100_cursor_right_sequence(positions))
 
     def send_bell(self):
         self.send_byte(BELL)
 
-    def send_erase_to_end_of_line(self):
-        msg = bytes([ESCAPE, VT100_LEFT_SQUARE_BRACKET, VT100_ERASE_TO_END_OF_LINE])
-        self.send_bytes(msg)
-
     def send_byte(self, byte):
-        self.send_bytes(bytes([byte]))
+        self.send_bytes(SINGLE_BYTES[byte])
 
     def send_bytes(self, msg):
+        # The bytes are not written right away; they are collected and written by flush_output so
+        # that all output produced while processing one chunk of input goes out in one write.
         if self._tx_fd is None:
             return
-        os.write(self._tx_fd, msg)
+        self._tx_pending.extend(msg)
 
-    def must_echo(self):
-        # In interactive mode, always echo
-        if not self._telnet:
-            return True
-        # In Telnet mode, echo if negotiated
-        elif self._telnet_echo:
-            return True
-        else:
-            return False
+    def send_bytes_parts(self, parts):
+        # Same as send_bytes for the concatenation of the parts, but without building the
+        # concatenation; each part is copied straight into the pending output buffer
+        if self._tx_fd is None:
+            return
+        for part in parts:
+            self._tx_pending.extend(part)
+
+    def flush_output(self):
+        # The file descriptor is blocking, so os.write only returns after writing some bytes
+        while self._tx_pending and self._tx_fd is not None:
+            written = os.write(self._tx_fd, self._tx_pending)
+            del self._tx_pending[:written]
+
+    def set_telnet_echo(self, telnet_echo):
+        self._telnet_echo = telnet_echo
+        # In interactive mode, always echo. In Telnet mode, echo if negotiated. This is checked for
+        # every echoed byte, so it is only evaluated when the Telnet echo option changes.
+        self._must_echo = (not self._telnet) or self._telnet_echo
 
     def echo_byte(self, byte):
-        if self.must_echo():
-            self.send_bytes(bytes([byte]))
+        if self._must_echo:
+            self.send_bytes(SINGLE_BYTES[byte])
 
-    def echo_bytes(self, byte_list):
-        if self.must_echo():
-            self.send_bytes(bytes(byte_list))
+    def echo_bytes(self, msg):
+        if self._must_echo:
+            self.send_bytes(msg)
 
     def set_current_node(self, node):
         self._current_node = node
@@ -333,64 +458,74 @@ class CliSessionHandler:
         return self._current_node
 
     def ready_to_read(self):
+        rx_fd = self._rx_fd
         try:
-            new_input_bytes = os.read(self._rx_fd, READ_CHUNK_SIZE)
+            new_input_bytes = os.read(rx_fd, READ_CHUNK_SIZE)
         except (ConnectionResetError, OSError, IOError, MemoryError):
             new_input_bytes = None
         if not new_input_bytes:
             # Remote side closed session
             self.close()
             return
-        self._input_bytes_buffer += new_input_bytes
+        self._input_bytes_buffer.extend(new_input_bytes)
         self.parse_input_bytes()
 
+    def input_bytes_available(self):
+        return len(self._input_bytes_buffer) - self._input_bytes_pos
+
+    def compact_input_bytes(self):
+        # Discard the bytes that have already been consumed from the front of the input buffer.
+        # We don't do this for every consumed byte, because that would make parsing the input
+        # quadratic in the number of received bytes.
+        if self._input_bytes_pos >= len(self._input_bytes_buffer):
+            self._input_bytes_buffer.clear()
+            self._input_bytes_pos = 0
+        elif self._input_bytes_pos > INPUT_BUFFER_COMPACT_THRESHOLD:
+            del self._input_bytes_buffer[:self._input_bytes_pos]
+            self._input_bytes_pos = 0
+
     def parse_input_bytes(self):
+        # This loop runs for every received byte. Look up the attributes and functions that it
+        # uses once, before entering the loop.
+        input_bytes = self._input_bytes_buffer
+        match_printable_run = PRINTABLE_RUN_REGEX.match
+        dispatch_table = INPUT_DISPATCH_TABLE
         need_more_input = False
-        while not need_more_input and self._input_bytes_buffer:
-            byte = self._input_bytes_buffer[0]
-            self._input_bytes_buffer = self._input_bytes_buffer[1:]
-            if byte == TELNET_NULL:
-                pass
-            elif byte == LINE_FEED:
-                need_more_input = self.process_line_feed()
-            elif byte == CARRIAGE_RETURN:
-                need_more_input = self.process_carriage_return()
-            elif byte == CONTROL_A:
-                need_more_input = self.process_cursor_to_start_of_line()
-            elif byte == CONTROL_E:
-                need_more_input = self.process_cursor_to_end_of_line()
-            elif byte == CONTROL_N:
-                self.process_next_history()
-            elif byte == CONTROL_P:
-                self.process_prev_history()
-            elif byte == TELNET_INTERPRET_AS_COMMAND:
-                need_more_input = self.process_telnet_command()
-            elif byte == DELETE:
-                need_more_input = self.process_delete()
-            elif byte == ESCAPE:
-                need_more_input = self.process_escape()
-            elif byte == QUESTION_MARK:
-                self.process_question_mark()
-            else:
-                need_more_input = self.process_other(byte)
+        while not need_more_input and self._input_bytes_pos < len(input_bytes):
+            match = match_printable_run(input_bytes, self._input_bytes_pos)
+            if match:
+                # Pass a view on the input buffer to avoid copying the run. The view must be
+                # released before the input buffer is resized.
+                with memoryview(input_bytes)[match.start():match.end()] as chars:
+                    self.process_printable_run(chars)
+                self._input_bytes_pos = match.end()
+                continue
+            byte = input_bytes[self._input_bytes_pos]
+            self._input_bytes_pos += 1
+            need_more_input = dispatch_table[byte](self, byte)
             if need_more_input:
                 # Byte was not consumed, put it back
-                self._input_bytes_buffer = bytes([byte]) + self._input_bytes_buffer
+                self._input_bytes_pos -= 1
+        self.compact_input_bytes()
+        self.flush_output()
 
-    def process_line_feed(self):
+    def process_telnet_null(self, _byte):
+        return False
+
+    def process_line_feed(self, _byte):
         return self.process_end_of_line()
 
-    def process_carriage_return(self):
-        if not self._input_bytes_buffer:
+    def process_carriage_return(self, _byte):
+        if self.input_bytes_available() < 1:
             # We need to read more bytes to complete the CR+LF pair
             return True
-        line_feed = self._input_bytes_buffer[0]
+        line_feed = self._input_bytes_buffer[self._input_bytes_pos]
         if line_feed == LINE_FEED:
-            self._input_bytes_buffer = self._input_bytes_buffer[1:]
+            self._input_bytes_pos += 1
         return self.process_end_of_line()
 
     def process_end_of_line(self):
-        self.echo_bytes([CARRIAGE_RETURN, LINE_FEED])
+        self.echo_bytes(CARRIAGE_RETURN_LINE_FEED)
         try:
             command = self._command_buffer.decode("utf-8", "ignore")
         except UnicodeDecodeError:
@@ -400,39 +535,35 @@ class CliSessionHandler:
             self.parse_command(command)
             self.print_prompt()
         if self._command_buffer:
-            self._command_history.append(self._command_buffer)
-            while len(self._command_history) > MAX_HISTORY:
-                self._command_history = self._command_history[1:]
+            self._command_history.append(bytes(self._command_buffer))
             self._command_history_pos = None
-        self._command_buffer = bytes()
+        self._command_buffer = bytearray()
         self._command_buffer_pos = 0
         return False
 
-    def process_telnet_command(self):
-        if len(self._input_bytes_buffer) < 2:
+    def process_telnet_command(self, _byte):
+        if self.input_bytes_available() < 2:
             # We need to receive more bytes before we can parse the Telnet command
             return True
-        telnet_command = self._input_bytes_buffer[0]
-        telnet_option = self._input_bytes_buffer[1]
-        self._input_bytes_buffer = self._input_bytes_buffer[2:]
+        telnet_command = self._input_bytes_buffer[self._input_bytes_pos]
+        telnet_option = self._input_bytes_buffer[self._input_bytes_pos + 1]
+        self._input_bytes_pos += 2
         if telnet_command == TELNET_DO:
             if telnet_option == TELNET_OPTION_SUPPRESS_GO_AHEAD:
                 self._telnet_suppress_go_ahead = True
             if telnet_option == TELNET_OPTION_ECHO:
-                self._telnet_echo = True
+                self.set_telnet_echo(True)
         elif telnet_command == TELNET_DONT:
             if telnet_option == TELNET_OPTION_SUPPRESS_GO_AHEAD:
                 self._telnet_suppress_go_ahead = False
             if telnet_option == TELNET_OPTION_ECHO:
-                self._telnet_echo = False
+                self.set_telnet_echo(False)
         return False
 
-    def process_delete(self):
+    def process_delete(self, _byte):
         pos = self._command_buffer_pos
         if pos > 0:
-            before = self._command_buffer[0:pos-1]
-            after = self._command_buffer[pos:]
-            self._command_buffer = before + after
+            del self._command_buffer[pos-1]
             self._command_buffer_pos -= 1
             self.send_cursor_left()
             self.refresh_command_from_pos()
@@ -440,14 +571,14 @@ class CliSessionHandler:
             self.send_bell()
         return False
 
-    def process_escape(self):
+    def process_escape(self, _byte):
         # We only support VT100 escape sequences of the form ESCAPE + [ + letter
-        if len(self._input_bytes_buffer) < 2:
+        if self.input_bytes_available() < 2:
             # Need at least two characters after the ESCAPE
             return True
-        vt100_char_1 = self._input_bytes_buffer[0]
-        vt100_char_2 = self._input_bytes_buffer[1]
-        self._input_bytes_buffer = self._input_bytes_buffer[2:]
+        vt100_char_1 = self._input_bytes_buffer[self._input_bytes_pos]
+        vt100_char_2 = self._input_bytes_buffer[self._input_bytes_pos + 1]
+        self._input_bytes_pos += 2
         if vt100_char_1 != VT100_LEFT_SQUARE_BRACKET:
             return False
         if vt100_char_2 == VT100_CURSOR_LEFT:
@@ -474,35 +605,38 @@ class CliSessionHandler:
         else:
             self.send_bell()
 
-    def process_cursor_to_start_of_line(self):
+    def process_cursor_to_start_of_line(self, _byte):
         if self._command_buffer_pos > 0:
             positions = self._command_buffer_pos
             self.send_cursor_left(positions)
             self._command_buffer_pos = 0
         return False
 
-    def process_cursor_to_end_of_line(self):
+    def process_cursor_to_end_of_line(self, _byte):
         if self._command_buffer_pos < len(self._command_buffer):
             positions = len(self._command_buffer) - self._command_buffer_pos
             self.send_cursor_right(positions)
             self._command_buffer_pos = len(self._command_buffer)
         return False
 
-    def process_prev_history(self):
-        if self._command_history == []:
+    def process_prev_history(self, _byte=None):
+        if not self._command_history:
             self.send_bell()
             return
         if self._command_history_pos is None:
-            self._command_history_pos = len(self._command_history)
             if self._command_buffer:
-                self._command_history.append(self._command_buffer)
+                # Determine the position after appending; appending may discard the oldest command
+                self._command_history.append(bytes(self._command_buffer))
+                self._command_history_pos = len(self._command_history) - 1
+            else:
+                self._command_history_pos = len(self._command_history)
         if self._command_history_pos == 0:
             self.send_bell()
             return
         self._command_history_pos -= 1
         self.replace_command(self._command_history[self._command_history_pos])
 
-    def process_next_history(self):
+    def process_next_history(self, _byte=None):
         if self._command_history_pos is None:
             self.send_bell()
             return
@@ -513,7 +647,7 @@ class CliSessionHandler:
         else:
             self.replace_command(self._command_history[self._command_history_pos])
 
-    def process_question_mark(self):
+    def process_question_mark(self, _byte):
         self.print("")
         try:
             command = self._command_buffer.decode("utf-8", "ignore")
@@ -528,14 +662,46 @@ class CliSessionHandler:
     def process_other(self, byte):
         if self._command_buffer_pos >= len(self._command_buffer):
             self.echo_byte(byte)
-            self._command_buffer += bytes([byte])
+            self._command_buffer.append(byte)
             self._command_buffer_pos += 1
         else:
-            pos = self._command_buffer_pos
-            before = self._command_buffer[0:pos]
-            after = self._command_buffer[pos:]
-            self._command_buffer = before + bytes([byte]) + after
+            self._command_buffer.insert(self._command_buffer_pos, byte)
             self.refresh_command_from_pos()
             self._command_buffer_pos += 1
             self.send_cursor_right()
         return False
+
+    def process_printable_run(self, chars):
+        # Same as calling process_other for each character, but with a single insert into the
+        # command buffer and a single redraw of the line
+        if self._command_buffer_pos >= len(self._command_buffer):
+            self.echo_bytes(chars)
+            self._command_buffer.extend(chars)
+            self._command_buffer_pos += len(chars)
+        else:
+            pos = self._command_buffer_pos
+            self._command_buffer[pos:pos] = chars
+            self.refresh_command_from_pos()
+            self._command_buffer_pos += len(chars)
+            self.send_cursor_right(len(chars))
+
+def build_input_dispatch_table():
+    # Return a table, indexed by byte value, of the functions that process an input byte. Each
+    # function is called with the session and the byte, and returns True if more input bytes are
+    # needed before the byte can be consumed. The table holds plain functions (not bound methods)
+    # so that it can be shared by all sessions without a session referring to itself.
+    table = [CliSessionHandler.process_other] * 256
+    table[TELNET_NULL] = CliSessionHandler.process_telnet_null
+    table[LINE_FEED] = CliSessionHandler.process_line_feed
+    table[CARRIAGE_RETURN] = CliSessionHandler.process_carriage_return
+    table[CONTROL_A] = CliSessionHandler.process_cursor_to_start_of_line
+    table[CONTROL_E] = CliSessionHandler.process_cursor_to_end_of_line
+    table[CONTROL_N] = CliSessionHandler.process_next_history
+    table[CONTROL_P] = CliSessionHandler.process_prev_history
+    table[TELNET_INTERPRET_AS_COMMAND] = CliSessionHandler.process_telnet_command
+    table[DELETE] = CliSessionHandler.process_delete
+    table[ESCAPE] = CliSessionHandler.process_escape
+    table[QUESTION_MARK] = CliSessionHandler.process_question_mark
+    return tuple(table)
+
+INPUT_DISPATCH_TABLE = build_input_dispatch_table()
@@ -1,4 +1,4 @@
-import select
+import selectors
 import time
 from timer import TIMER_SCHEDULER
 from fsm import Fsm
@@ -7,7 +7,10 @@ class Scheduler:
 
     def __init__(self):
         self._handlers_by_rx_fd = {}
-        self._rx_fds = []
+        # Use the most efficient mechanism available on the platform (epoll on Linux, kqueue on
+        # BSD and macOS); file descriptors are registered with the kernel once instead of being
+        # passed in on every wait, which matters when there are many CLI sessions.
+        self._selector = selectors.DefaultSelector()
         self.slip_count_10ms = 0
         self.slip_count_100ms = 0
         self.slip_count_1000ms = 0
@@ -19,13 +22,13 @@ class Scheduler:
     def register_handler(self, handler):
         rx_fd = handler.rx_fd()
         self._handlers_by_rx_fd[rx_fd] = handler
-        self._rx_fds.append(rx_fd)
+        self._selector.register(rx_fd, selectors.EVENT_READ)
 
     def unregister_handler(self, handler):
         rx_fd = handler.rx_fd()
         if rx_fd is not None and rx_fd in self._handlers_by_rx_fd:
             del self._handlers_by_rx_fd[rx_fd]
-            self._rx_fds.remove(rx_fd)
+            self._selector.unregister(rx_fd)
 
     def run(self):
         while True:
@@ -44,7 +47,7 @@ class Scheduler:
                 self.max_expired_timers_proc_time = max(self.max_expired_timers_proc_time, duration)
             # Wait for ready to read or expired timer
             start_time = time.monotonic()
-            rx_ready, _, _ = select.select(self._rx_fds, [], [], timeout)
+            rx_ready = self._selector.select(timeout)
             duration = time.monotonic() - start_time
             self.max_select_proc_time = max(self.max_select_proc_time, duration)
             # Check for timer slips
@@ -57,9 +60,14 @@ class Scheduler:
                 if slip_time > 1.0:
                     self.slip_count_1000ms += 1
             # Process all handlers that are ready to read
-            for rx_fd in rx_ready:
+            handlers_by_rx_fd = self._handlers_by_rx_fd
+            for (selector_key, _events) in rx_ready:
+                # The handler may have been unregistered by another handler that was processed
+                # earlier in this same loop
+                handler = handlers_by_rx_fd.get(selector_key.fd)
+                if handler is None:
+                    continue
                 start_time = time.monotonic()
-                handler = self._handlers_by_rx_fd[rx_fd]
                 handler.ready_to_read()
                 duration = time.monotonic() - start_time
                 self.max_ready_to_read_proc_time = max(self.max_ready_to_read_proc_time, duration)
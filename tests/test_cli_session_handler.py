@@ -0,0 +1,82 @@
+import cli_session_handler
+
+def command_a():
+    pass
+
+def command_b():
+    pass
+
+def command_c():
+    pass
+
+def command_d():
+    pass
+
+PARSE_TREE = {
+    "set": {
+        "$interface": command_a,
+        "$node": command_b,
+        "$level": command_c
+    },
+    "show": {
+        "interfaces": command_a,
+        "$interface": command_b,
+        "spf": command_c,
+        "statistics": command_d
+    }
+}
+
+def match(token, parse_subtree):
+    cli_session_handler.get_parse_tree_index(PARSE_TREE)
+    return cli_session_handler.match_token_in_parse_subtree(token, id(PARSE_TREE),
+                                                            id(parse_subtree))
+
+def test_tokens_with_prefix():
+    sorted_tokens = ["interface", "interfaces", "spf", "statistics"]
+    assert cli_session_handler.tokens_with_prefix(sorted_tokens, "s") == ["spf", "statistics"]
+    assert cli_session_handler.tokens_with_prefix(sorted_tokens, "interface") == ["interface",
+                                                                                  "interfaces"]
+    assert cli_session_handler.tokens_with_prefix(sorted_tokens, "st") == ["statistics"]
+    assert not cli_session_handler.tokens_with_prefix(sorted_tokens, "a")
+    assert not cli_session_handler.tokens_with_prefix(sorted_tokens, "z")
+    assert not cli_session_handler.tokens_with_prefix([], "s")
+
+def test_match_exact_keyword():
+    show = PARSE_TREE["show"]
+    assert match("interfaces", show) == ((("interfaces", command_a),), ())
+    assert match("spf", show) == ((("spf", command_c),), ())
+
+def test_match_exact_parameter():
+    # An exact parameter match returns the parameter name without the $ prefix
+    show = PARSE_TREE["show"]
+    assert match("interface", show) == ((), (("interface", command_b),))
+
+def test_match_partial_keyword():
+    show = PARSE_TREE["show"]
+    assert match("sp", show) == ((("spf", command_c),), ())
+    assert match("s", show) == ((("spf", command_c), ("statistics", command_d)), ())
+
+def test_match_partial_keyword_and_parameter():
+    show = PARSE_TREE["show"]
+    assert match("i", show) == ((("interfaces", command_a),), (("$interface", command_b),))
+
+def test_match_partial_parameters_sorted():
+    set_ = PARSE_TREE["set"]
+    assert match("n", set_) == ((), (("$node", command_b),))
+    assert match("l", set_) == ((), (("$level", command_c),))
+
+def test_match_token_starting_with_dollar():
+    # A token that starts with $ is matched against the keywords as typed, which includes the
+    # parameters with their $ prefix; candidates are returned in sorted order
+    set_ = PARSE_TREE["set"]
+    assert match("$", set_) == ((("$interface", command_a),
+                                 ("$level", command_c),
+                                 ("$node", command_b)), ())
+    assert match("$n", set_) == ((("$node", command_b),), ())
+    assert match("$node", set_) == ((("$node", command_b),), ())
+
+def test_match_no_match():
+    show = PARSE_TREE["show"]
+    assert match("x", show) == ((), ())
+    assert match("interfacesx", show) == ((), ())
+    assert match("sets", PARSE_TREE) == ((), ())
@@ -356,6 +356,41 @@ def check_non_empty_history(session):
     session.expect("Predecessor")
     session.wait_prompt()
 
+def check_full_history(session):
+    session.checkpoint("check_full_history")
+    # Fill the history beyond its maximum size, so that the oldest commands have been discarded
+    nr_commands = cli_session_handler.MAX_HISTORY + 5
+    for index in range(nr_commands):
+        session.send("show interface entry-{:03d}\n".format(index))
+        session.expect("Error: interface entry-{:03d} not present".format(index))
+        session.wait_prompt()
+    last = nr_commands - 1
+    # Start navigating the (full) history with a partially entered command; the partially entered
+    # command is appended to the history, and the last entered command must be recalled
+    session.send("show s")
+    session.expect("show s")
+    session.send_special("up")
+    session.expect_special("left-6 erase-to-eol")
+    session.expect("show interface entry-{:03d}".format(last))
+    session.send_special("up")
+    session.expect_special("left-24 erase-to-eol")
+    session.expect("show interface entry-{:03d}".format(last - 1))
+    session.send_special("down")
+    session.expect_special("left-24 erase-to-eol")
+    session.expect("show interface entry-{:03d}".format(last))
+    # Going down past the last entered command recalls the partially entered command
+    session.send_special("down")
+    session.expect_special("left-24 erase-to-eol")
+    session.expect("show s")
+    # Going down once more leaves the history with an empty line
+    session.send_special("down")
+    session.expect_special("left-6 erase-to-eol")
+    session.send_special("down")
+    session.expect_special("bell")
+    session.send("show spf\n")
+    session.expect("Predecessor")
+    session.wait_prompt()
+
 def test_telnet_history():
     session = TelnetSession()
     check_telnet_negotiation(session)
@@ -364,6 +399,13 @@ def test_telnet_history():
     session.checkpoint("stop")
     session.stop()
 
+def test_telnet_full_history():
+    session = TelnetSession()
+    check_telnet_negotiation(session)
+    check_full_history(session)
+    session.checkpoint("stop")
+    session.stop()
+
 def check_line_move_left_right(session):
     session.checkpoint("check_line_move_left_right")
     session.send("help")
@@ -491,6 +533,19 @@ def check_edit_add_chars_at_start(session):
     session.send("\n")
     session.wait_prompt()
 
+def check_edit_add_run_in_middle(session):
+    session.checkpoint("check_edit_add_run_in_middle")
+    session.send("abcdef")
+    session.expect("abcdef")
+    session.send_special("left left left")
+    session.expect_special("left-1 left-1 left-1")
+    session.send("xyz")
+    session.expect_special("erase-to-eol")
+    session.expect("xyzdef")
+    session.expect_special("left-6 right-3")
+    session.send("\n")
+    session.wait_prompt()
+
 def check_del_at_end(session):
     session.checkpoint("check_del_at_end")
     session.send("abc")
@@ -542,6 +597,7 @@ def test_edit():
     check_edit_add_chars_at_end(session)
     check_edit_add_chars_in_middle(session)
     check_edit_add_chars_at_start(session)
+    check_edit_add_run_in_middle(session)
     check_del_at_end(session)
     check_del_in_middle(session)
     session.checkpoint("stop")